@@ -4,499 +4,250 @@ Mobile-friendly YT extractor for Termux (and cloud)
 
 Features:
 - Auto-detect single vs playlist (no mode dropdown)
-- Clean mobile UI:
+- Clean mobile UI (static/index.html, served minified + compressed):
     - Title "Video Downloader"
     - URL box + Fetch button
     - Status: Idle / Fetching… / Success / Failed
     - Results:
         Single: title once + Download (purple) + Preview
         Playlist: each item has title + Download + Preview
+- Playlists list instantly (flat); each item's file is resolved on click
+  via /resolve?url=<entry url>. /extract_stream (NDJSON) resolves all of them,
+  streaming items as they finish
 - Only uses real downloadable progressive files (audio+video, http/https)
 - /download endpoint proxies file so browser downloads with correct filename
 - /upload_cookies endpoint lets user upload cookies.txt from the browser
 - yt-dlp automatically uses cookies.txt IF it exists (for cloud / sign-in)
+- `python app.py` runs under gunicorn (gunicorn.conf.py);
+  FLASK_DEV=1 python app.py uses the Flask dev server instead
+- /extract results are cached (in-process + .cache/ on disk);
+  POST /cache/clear (with ADMIN_TOKEN set) drops the disk cache
 """
 
 from flask import (
     Flask,
     request,
     jsonify,
-    render_template_string,
     Response,
     stream_with_context,
 )
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.exceptions import HTTPException
+from werkzeug.wsgi import wrap_file
 from yt_dlp import YoutubeDL
-import urllib.request
+from diskcache import Cache
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import OrderedDict, deque
+import urllib.parse
+import requests
+import hashlib
+import hmac
+import shutil
+import gzip
+import threading
+import time
+import sys
 import re
 import os
 
-app = Flask(__name__)
+try:
+    import orjson
+except ImportError:  # optional: stdlib json is used instead
+    orjson = None
 
-# ------------------- FRONTEND (HTML + JS) -------------------
+try:
+    import brotli
+except ImportError:  # optional: the page is then served gzip-only
+    brotli = None
 
-HTML = r"""
-<!doctype html>
-<html>
-<head>
-<meta charset="utf-8" />
-<meta name="viewport" content="width=device-width,initial-scale=1" />
-<title>Video Downloader</title>
-<style>
-  :root{
-    --bg:#050816; --card:#0b1220; --muted:#9aa6b2;
-    --accent:#06b6d4; --accent2:#7c3aed; --purple:#a855f7; --bad:#ef4444;
-  }
-  html,body{
-    margin:0;height:100%;
-    font-family:system-ui,Roboto,Arial;
-    background:linear-gradient(180deg,#050816,#020617);
-    color:#eaf4ff;
-  }
-  .wrap{
-    max-width:640px;
-    margin:0 auto;
-    padding:12px;
-  }
-  .card{
-    background:rgba(15,23,42,0.98);
-    border-radius:16px;
-    padding:14px;
-    box-shadow:0 10px 30px rgba(0,0,0,0.7);
-    margin-bottom:12px;
-  }
-  .app-title{
-    font-size:20px;
-    font-weight:700;
-    text-align:center;
-    margin-bottom:6px;
-  }
-  .status{
-    font-size:13px;
-    text-align:center;
-    min-height:1.2em;
-    margin-bottom:8px;
-  }
-  .status.idle{color:var(--muted);}
-  .status.fetching{color:#fbbf24;}
-  .status.ok{color:#22c55e;}
-  .status.error{color:var(--bad);}
-
-  .field{margin-top:8px;}
-  label{
-    display:block;
-    font-size:13px;
-    color:var(--muted);
-    margin-bottom:4px;
-  }
-  input,button{font-size:15px;}
-  #url{
-    width:100%;
-    padding:10px;
-    border-radius:10px;
-    border:0;
-    background:rgba(15,23,42,0.9);
-    color:#eaf4ff;
-    box-sizing:border-box;
-  }
-  #fetchBtn{
-    width:100%;
-    padding:11px 14px;
-    margin-top:10px;
-    border-radius:10px;
-    border:0;
-    background:linear-gradient(90deg,var(--accent),var(--accent2));
-    color:white;
-    font-weight:600;
-  }
-  #error{
-    font-size:13px;
-    color:var(--bad);
-    min-height:1.2em;
-    margin-top:6px;
-    text-align:center;
-  }
-
-  /* Cookies area */
-  .cookies-box{
-    margin-top:12px;
-    padding:10px;
-    border-radius:12px;
-    background:rgba(15,23,42,0.9);
-    border:1px dashed rgba(148,163,184,0.5);
-    font-size:12px;
-  }
-  .cookies-row{
-    display:flex;
-    gap:8px;
-    margin-top:6px;
-    flex-wrap:wrap;
-  }
-  #cookiesFile{
-    flex:1;
-    font-size:12px;
-  }
-  #uploadCookiesBtn{
-    padding:7px 10px;
-    border-radius:8px;
-    border:0;
-    background:rgba(124,58,237,0.9);
-    color:#fdf4ff;
-    font-size:13px;
-  }
-  #cookiesStatus{
-    margin-top:4px;
-    font-size:11px;
-    color:var(--muted);
-  }
-
-  /* Results */
-  #title{
-    font-size:16px;
-    font-weight:600;
-    text-align:center;
-    margin-bottom:10px;
-    min-height:1.4em;
-  }
-  .video-box{
-    margin-top:10px;
-    padding:12px;
-    border-radius:12px;
-    background:rgba(15,23,42,0.95);
-    border:1px solid rgba(148,163,184,0.4);
-  }
-  .video-title{
-    font-size:14px;
-    font-weight:600;
-    text-align:center;
-    margin-bottom:8px;
-  }
-  .btn-row{
-    display:flex;
-    flex-direction:row;
-    gap:10px;
-    flex-wrap:wrap;
-    justify-content:center;
-  }
-  .btn-main{
-    flex:1;
-    min-width:120px;
-    padding:10px 12px;
-    border-radius:10px;
-    border:0;
-    font-size:15px;
-  }
-  .btn-download{
-    background:var(--purple);
-    color:#fdf4ff;
-  }
-  .btn-preview{
-    background:transparent;
-    border:1px solid rgba(148,163,184,0.7);
-    color:#eaf4ff;
-  }
-  .btn-disabled{
-    opacity:0.5;
-    pointer-events:none;
-  }
-  .note{
-    font-size:12px;
-    color:var(--muted);
-    text-align:center;
-    margin-top:6px;
-  }
-
-  @media (max-width:400px){
-    .btn-main{min-width:100%;}
-  }
-</style>
-</head>
-<body>
-<div class="wrap">
-
-  <!-- Controls -->
-  <div class="card">
-    <div class="app-title">Video Downloader</div>
-    <div id="status" class="status idle">Idle</div>
-
-    <div class="field">
-      <label for="url">YouTube URL</label>
-      <input id="url" placeholder="https://www.youtube.com/watch?v=..." />
-    </div>
-
-    <button id="fetchBtn">Fetch</button>
-
-    <div id="error"></div>
-
-    <div class="cookies-box">
-      <div><b>Optional:</b> Upload <code>cookies.txt</code> for cloud / sign-in videos.</div>
-      <div class="cookies-row">
-        <input type="file" id="cookiesFile" accept=".txt" />
-        <button id="uploadCookiesBtn">Upload cookies</button>
-      </div>
-      <div id="cookiesStatus">No cookies uploaded yet.</div>
-    </div>
-  </div>
-
-  <!-- Results -->
-  <div class="card">
-    <div id="title"></div>
-    <div id="results"></div>
-  </div>
-
-</div>
-
-<script>
-function $(id){return document.getElementById(id);}
-
-function setStatus(state, msg){
-  const el = $('status');
-  el.className = 'status ' + state;
-  el.textContent = msg;
-}
-function setError(msg){
-  $('error').textContent = msg || '';
-}
 
-async function fetchData(){
-  const url = $('url').value.trim();
-  setError('');
-  $('title').textContent = '';
-  $('results').innerHTML = '';
-
-  if(!url){
-    setStatus('error','Failed');
-    setError('Enter URL');
-    return;
-  }
-
-  setStatus('fetching','Fetching…');
-
-  try{
-    const resp = await fetch('/extract', {
-      method:'POST',
-      headers:{'Content-Type':'application/json'},
-      body: JSON.stringify({url})
-    });
-
-    const txt = await resp.text();
-    let data = null;
-    try{ data = JSON.parse(txt); }catch(e){}
-
-    if(!resp.ok){
-      const msg = (data && data.error) ? data.error : (txt || ('HTTP '+resp.status));
-      setStatus('error','Failed');
-      setError(msg);
-      return;
-    }
-    if(!data){
-      setStatus('error','Failed');
-      setError('Empty response');
-      return;
-    }
+class OrjsonProvider(DefaultJSONProvider):
+    """jsonify() / app.json.dumps() / request.get_json() through orjson."""
 
-    if(data.mode === 'playlist'){
-      renderPlaylist(data);
-    }else{
-      renderSingle(data);
-    }
-    setStatus('ok','Success');
-  }catch(e){
-    console.error(e);
-    setStatus('error','Failed');
-    setError(e.message || String(e));
-  }
-}
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default).decode("utf-8")
 
-function buildDownloadUrl(file, title){
-  const params = new URLSearchParams();
-  params.set('url', file.url);
-  params.set('title', title || 'video');
-  params.set('ext', file.ext || 'mp4');
-  return '/download?' + params.toString();
-}
+    def loads(self, s, **kwargs):
+        # orjson.JSONDecodeError is a ValueError, so get_json(silent=True)
+        # still turns bad bodies into None
+        return orjson.loads(s)
 
-function renderSingle(data){
-  const results = $('results');
-  results.innerHTML = '';
-  const title = data.title || 'Video';
-  $('title').textContent = title;
-
-  const file = data.file;
-
-  const box = document.createElement('div');
-  box.className = 'video-box';
-
-  const row = document.createElement('div');
-  row.className = 'btn-row';
-
-  const btnDl = document.createElement('button');
-  btnDl.className = 'btn-main btn-download';
-  btnDl.textContent = 'Download';
-
-  const btnPrev = document.createElement('button');
-  btnPrev.className = 'btn-main btn-preview';
-  btnPrev.textContent = 'Preview';
-
-  if(!file || !file.url){
-    btnDl.classList.add('btn-disabled');
-    btnPrev.classList.add('btn-disabled');
-    row.appendChild(btnDl);
-    row.appendChild(btnPrev);
-    box.appendChild(row);
-    const note = document.createElement('div');
-    note.className = 'note';
-    note.textContent = data.reason || 'No direct downloadable file found.';
-    box.appendChild(note);
-  }else{
-    btnDl.addEventListener('click', ()=>{
-      const proxyUrl = buildDownloadUrl(file, title);
-      const a = document.createElement('a');
-      a.href = proxyUrl;
-      a.target = '_blank';
-      document.body.appendChild(a);
-      a.click();
-      a.remove();
-    });
-
-    btnPrev.addEventListener('click', ()=>{
-      const w = window.open('', '_blank');
-      const esc = (file.url || '').replace(/"/g,'&quot;');
-      w.document.write(
-        '<title>Preview</title>' +
-        '<body style="margin:0;background:#000;display:flex;align-items:center;justify-content:center;height:100vh">' +
-        '<video controls autoplay style="max-width:100%;max-height:100%">' +
-        '<source src="'+esc+'">' +
-        '</video></body>'
-      );
-    });
-
-    row.appendChild(btnDl);
-    row.appendChild(btnPrev);
-    box.appendChild(row);
-  }
-
-  results.appendChild(box);
+    def response(self, *args, **kwargs):
+        # Skip the bytes -> str -> bytes round trip of the default response()
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=self.default, option=orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+app = Flask(__name__)
+if orjson is not None:
+    app.json = OrjsonProvider(app)
+
+# The only expected body is {"url": "..."}; anything bigger is rejected
+# before Werkzeug buffers it. cookies.txt uploads get their own limit.
+app.config["MAX_CONTENT_LENGTH"] = 8 * 1024
+COOKIES_MAX_BYTES = 2 * 1024 * 1024
+
+# cookies.txt only changes through /upload_cookies (which updates this
+# directly), so it is stat()ed at most every COOKIES_RECHECK seconds
+# instead of on every extract; that still notices edits made by hand.
+COOKIES_RECHECK = 5
+_cookies_state = {"checked": float("-inf"), "mtime_ns": None}
+
+# How many playlist items are resolved concurrently (network-bound, so
+# threads scale well until YouTube starts rate limiting). The pool lives
+# as long as the process so its threads keep their YoutubeDL (get_ydl).
+# Lower YT_CONCURRENCY on Termux / low-RAM hosts: one YoutubeDL per thread.
+PLAYLIST_WORKERS = max(1, int(os.environ.get("YT_CONCURRENCY", 12)))
+POOL = ThreadPoolExecutor(max_workers=PLAYLIST_WORKERS, thread_name_prefix="playlist")
+_ydl_local = threading.local()
+
+class TTLCache:
+    """Thread-safe, size-bounded LRU dict whose entries expire individually."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            hit = self._data.get(key)
+            if hit is None:
+                return None
+            if hit[0] <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return hit[1]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+# Extraction results: on-disk cache shared by all workers, plus a small
+# in-process layer for hot repeats. googlevideo links expire after ~6h, so
+# payloads carrying them live CACHE_TTL; lazy playlist listings hold no
+# links and can be kept for LISTING_TTL.
+CACHE_TTL = int(os.environ.get("CACHE_TTL", 60 * 60))
+LISTING_TTL = int(os.environ.get("LISTING_TTL", 24 * 60 * 60))
+HOT_TTL = 5 * 60
+cache = Cache(".cache")
+# Token for POST /cache/clear; the endpoint is disabled while it is unset
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+
+# Browser-side reuse of /extract and /resolve responses (conditional_json)
+EXTRACT_MAX_AGE = 5 * 60
+
+# cache key -> {"done": Event, "payload"} while one thread extracts it, so
+# identical concurrent requests wait for that instead (cached_extract)
+INFLIGHT_WAIT = 60
+_inflight = {}
+_inflight_lock = threading.Lock()
+_hot = TTLCache(256)
+
+# video id -> resolved {id, title, file}, kept until just before the
+# link's own expire= timestamp (at most URL_TTL)
+URL_TTL = 60 * 60
+_urls = TTLCache(4096)
+
+# /download reads/writes this many bytes per iteration; big chunks mean
+# far fewer generator resumes and WSGI writes per file.
+PROXY_CHUNK = 256 * 1024
+
+# /download?parallel=N fetches the file as PARALLEL_PIECE-sized Range GETs,
+# up to N (<= PARALLEL_MAX) at once, to get past per-connection throttling.
+# Each piece is buffered whole, so a download holds up to (N + 1) * 4 MiB:
+# off unless the server sets PARALLEL_MAX (e.g. 4) to allow it.
+PARALLEL_PIECE = 4 * 1024 * 1024
+PARALLEL_MAX = max(1, int(os.environ.get("PARALLEL_MAX", 1)))
+
+# Shared keep-alive pool for /download, so repeat fetches from the
+# googlevideo CDN skip the TCP + TLS handshake. HTTP_POOL bounds both the
+# number of hosts and the idle connections kept per host; the gevent
+# worker raises it to match its worker_connections (gunicorn.conf.py).
+HTTP_POOL = int(os.environ.get("HTTP_POOL", 32))
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_connections=HTTP_POOL, pool_maxsize=HTTP_POOL))
+SESSION.mount("http://", HTTPAdapter(pool_connections=HTTP_POOL, pool_maxsize=HTTP_POOL))
+
+# Let yt-dlp pick the best progressive file (audio+video over plain http,
+# no HLS/DASH) itself. "/best/b*" keeps extraction from failing when there
+# is none: "b*" also matches video-only / audio-only formats, so a video
+# with only split formats still extracts and selected_file() rejects it.
+FORMAT_SELECTOR = "best[protocol^=http][protocol!*=dash][acodec!=none][vcodec!=none]/best/b*"
+
+# Don't fetch what we throw away: HLS/DASH manifests (never progressive),
+# machine-translated subtitle tracks, and the per-client player configs.
+# Comments / subtitles / thumbnails are already off with skip_download.
+YOUTUBE_ARGS = {
+    "youtube": {
+        "skip": ["hls", "dash", "translated_subs"],
+        "player_skip": ["configs"],
+    },
 }
 
-function renderPlaylist(data){
-  const results = $('results');
-  results.innerHTML = '';
-  const title = data.title || 'Playlist';
-  const entries = data.entries || [];
-  $('title').textContent = title + (entries.length ? ' ('+entries.length+' items)' : '');
-
-  if(!entries.length){
-    const note = document.createElement('div');
-    note.className = 'note';
-    note.textContent = data.reason || 'No items in playlist (all unavailable / deleted / locked).';
-    results.appendChild(note);
-    return;
-  }
-
-  entries.forEach((e, idx)=>{
-    const box = document.createElement('div');
-    box.className = 'video-box';
-
-    const t = document.createElement('div');
-    t.className = 'video-title';
-    t.textContent = (idx+1) + '. ' + (e.title || e.id || 'Item');
-    box.appendChild(t);
-
-    const row = document.createElement('div');
-    row.className = 'btn-row';
-
-    const btnDl = document.createElement('button');
-    btnDl.className = 'btn-main btn-download';
-    btnDl.textContent = 'Download';
-
-    const btnPrev = document.createElement('button');
-    btnPrev.className = 'btn-main btn-preview';
-    btnPrev.textContent = 'Preview';
-
-    const file = e.file;
-
-    if(!file || !file.url){
-      btnDl.classList.add('btn-disabled');
-      btnPrev.classList.add('btn-disabled');
-      row.appendChild(btnDl);
-      row.appendChild(btnPrev);
-      box.appendChild(row);
-      const note = document.createElement('div');
-      note.className = 'note';
-      note.textContent = e.reason || 'No direct downloadable file for this item.';
-      box.appendChild(note);
-    }else{
-      btnDl.addEventListener('click', ()=>{
-        const proxyUrl = buildDownloadUrl(file, e.title || 'item');
-        const a = document.createElement('a');
-        a.href = proxyUrl;
-        a.target = '_blank';
-        document.body.appendChild(a);
-        a.click();
-        a.remove();
-      });
-      btnPrev.addEventListener('click', ()=>{
-        const w = window.open('', '_blank');
-        const esc = (file.url || '').replace(/"/g,'&quot;');
-        w.document.write(
-          '<title>Preview</title>' +
-          '<body style="margin:0;background:#000;display:flex;align-items:center;justify-content:center;height:100vh">' +
-          '<video controls autoplay style="max-width:100%;max-height:100%">' +
-          '<source src="'+esc+'">' +
-          '</video></body>'
-        );
-      });
-      row.appendChild(btnDl);
-      row.appendChild(btnPrev);
-      box.appendChild(row);
-    }
+# Only register the extractors this app needs: YoutubeDL() then takes ~2ms
+# instead of ~60ms setting up all ~1750 of them. Set YT_EXTRACTORS=default
+# to accept every site yt-dlp supports.
+ALLOWED_EXTRACTORS = os.environ.get(
+    "YT_EXTRACTORS", "youtube,youtube:tab,youtube:playlist,generic").split(",")
 
-    results.appendChild(box);
-  });
-}
+# Client request headers /download passes on to the upstream fetch
+FORWARD_HEADERS = ("Range", "If-Range", "User-Agent")
 
-async function uploadCookies(){
-  const input = $('cookiesFile');
-  const status = $('cookiesStatus');
-  if(!input.files || !input.files[0]){
-    status.textContent = 'Choose a cookies.txt file first.';
-    return;
-  }
-  const file = input.files[0];
-  status.textContent = 'Uploading cookies…';
-
-  const fd = new FormData();
-  fd.append('file', file);
-
-  try{
-    const resp = await fetch('/upload_cookies', {
-      method: 'POST',
-      body: fd
-    });
-    const data = await resp.json().catch(()=>null);
-    if(!resp.ok){
-      status.textContent = (data && data.error) ? data.error : 'Upload failed.';
-      return;
-    }
-    status.textContent = data && data.message ? data.message : 'Cookies uploaded.';
-  }catch(e){
-    console.error(e);
-    status.textContent = 'Upload error: ' + (e.message || String(e));
-  }
-}
+# Behind nginx, USE_X_ACCEL=1 makes /download answer with an X-Accel-Redirect
+# to this internal location so nginx fetches and sends the bytes itself
+# (see x_accel_location()) instead of tying up a worker per download.
+USE_X_ACCEL = os.environ.get("USE_X_ACCEL") == "1"
+X_ACCEL_PREFIX = os.environ.get("X_ACCEL_PREFIX", "/_internal_dl/")
 
-$('fetchBtn').addEventListener('click', fetchData);
-$('url').addEventListener('keydown', e=>{ if(e.key === 'Enter') fetchData(); });
-$('uploadCookiesBtn').addEventListener('click', uploadCookies);
+YOUTUBE_HOSTS = {"youtube.com", "www.youtube.com", "m.youtube.com", "music.youtube.com", "youtu.be"}
+TRACKING_PARAMS = {"t", "si", "feature", "pp", "ab_channel"}
 
-setStatus('idle','Idle');
-</script>
-</body>
-</html>
-"""
+# ------------------- FRONTEND (HTML + JS) -------------------
+
+# The page lives in static/index.html; it is read once at import below.
+HTML_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "index.html")
+
+def _minify_html(html):
+    """
+    Cheap, safe minification: drop <!-- --> and /* */ comments, whole-line
+    // comments, indentation and blank lines, and squeeze the CSS onto one
+    line. Newlines outside <style> are kept, so JS semicolon insertion is
+    unaffected (the page has no multi-line strings).
+    """
+    html = re.sub(r'<!--.*?-->|/\*.*?\*/', '', html, flags=re.S)
+    lines = (line.strip() for line in html.splitlines())
+    html = "\n".join(line for line in lines if line and not line.startswith("//"))
+    # CSS doesn't need newlines at all
+    return re.sub(r'<style>.*?</style>',
+                  lambda m: re.sub(r'\s*([{};,])\s*', r'\1', m.group(0).replace("\n", "")),
+                  html, flags=re.S)
+
+# The page has no template expressions, so minify, encode (and gzip) it
+# once here instead of running it through Jinja on every request. Only
+# these bytes are kept, not the source text.
+with open(HTML_PATH, encoding="utf-8") as f:
+    HTML_BYTES = _minify_html(f.read()).encode("utf-8")
+HTML_GZ = gzip.compress(HTML_BYTES, compresslevel=9)
+# Content-Encoding -> body, in the order index() prefers them
+HTML_ENCODED = {"gzip": HTML_GZ}
+if brotli is not None:
+    HTML_ENCODED = {"br": brotli.compress(HTML_BYTES, quality=11), **HTML_ENCODED}
+HTML_ETAG = hashlib.sha256(HTML_BYTES).hexdigest()[:16]
 
 # ------------------- BACKEND HELPERS -------------------
 
+_SIZE_UNITS = ('B', 'KB', 'MB', 'GB', 'TB', 'PB')
+
 def human_size(n):
     if not n:
         return ''
@@ -504,11 +255,9 @@ def human_size(n):
         n = int(n)
     except:
         return ''
-    for unit in ['B','KB','MB','GB','TB']:
-        if n < 1024:
-            return f"{n:.1f}{unit}"
-        n /= 1024.0
-    return f"{n:.1f}PB"
+    # Unit index straight from the bit length: one division, no loop
+    i = min((n.bit_length() - 1) // 10, 5)
+    return f"{n / (1 << (10 * i)):.1f}{_SIZE_UNITS[i]}"
 
 def is_downloadable_file(fmt: dict) -> bool:
     """
@@ -517,90 +266,308 @@ def is_downloadable_file(fmt: dict) -> bool:
     - has audio+video
     - protocol is http/https (no m3u8/dash/mpd)
     """
-    url = fmt.get("url")
-    if not url:
+    g = fmt.get
+    ac, vc = g("acodec"), g("vcodec")
+    if not g("url") or not ac or ac == "none" or not vc or vc == "none":
         return False
-    proto = (fmt.get("protocol") or "").lower()
+    proto = (g("protocol") or "").lower()
     if "m3u8" in proto or "dash" in proto or "mpd" in proto:
         return False
-    ac = fmt.get("acodec")
-    vc = fmt.get("vcodec")
-    if not ac or ac == "none":
-        return False
-    if not vc or vc == "none":
-        return False
-    if proto and not proto.startswith("http"):
-        return False
-    return True
+    return not proto or proto.startswith("http")
+
+def _file_score(f):
+    # tuple, not height*1000+tbr: a >1000 kbps tbr must never outrank height
+    g = f.get
+    return (g("height") or 0, g("tbr") or 0)
 
 def choose_best_file(formats):
     """Pick best downloadable file by height + bitrate."""
-    best = None
-    best_score = -1
-    for f in formats:
-        if not is_downloadable_file(f):
-            continue
-        h = int(f.get("height") or 0)
-        tbr = int(float(f.get("tbr") or 0))
-        score = h * 1000 + tbr
-        if score > best_score:
-            best_score = score
-            best = f
-    return best
-
-def fmt_to_file(f):
+    return max(filter(is_downloadable_file, formats), key=_file_score, default=None)
+
+def selected_file(info):
+    """
+    The format yt-dlp picked via FORMAT_SELECTOR (copied onto the top level
+    of info). Falls back to scanning info["formats"] if that pick is not a
+    progressive http file, i.e. when a "/best" or "/b*" fallback matched
+    (None then, unless some progressive http format is there after all).
+    """
+    if is_downloadable_file(info):
+        return info
+    return choose_best_file(info.get("formats") or [])
+
+def file_size(f, head=False):
+    """
+    Size in bytes of format f: yt-dlp's filesize(_approx), else the clen=
+    googlevideo links carry, else (head=True only) one HEAD to the file.
+    None if unknown.
+    """
+    size = f.get("filesize") or f.get("filesize_approx")
+    url = f.get("url")
+    if size or not url:
+        return size
+    query = urllib.parse.parse_qs(urllib.parse.urlsplit(url).query)
+    try:
+        return int(query["clen"][0])
+    except (KeyError, ValueError):
+        pass
+    if not head:
+        return None
+    try:
+        with SESSION.head(url, allow_redirects=True, timeout=2,
+                          headers={"Accept-Encoding": "identity"}) as resp:
+            if resp.ok:
+                return int(resp.headers.get("Content-Length", 0)) or None
+    except (requests.RequestException, ValueError):
+        pass
+    return None
+
+def fmt_to_file(f, head=False):
+    """
+    {url, ext, filesize} for format f. head=True allows a HEAD for a size
+    yt-dlp doesn't know: only for callers on POOL threads (playlist_item),
+    where it overlaps the other items; /extract and /resolve answer on the
+    request thread and stay without it.
+    """
     if not f:
         return None
     return {
         "url": f.get("url"),
         "ext": f.get("ext") or "mp4",
-        "filesize": human_size(f.get("filesize") or f.get("filesize_approx")),
+        "filesize": human_size(file_size(f, head)),
+    }
+
+# The only fields anything below reads. _slim() drops the rest (thumbnails,
+# subtitles, heatmap, chapters, per-format fragments / http_headers...)
+# right after extraction, so those dicts are not kept alive while a
+# playlist is resolved.
+FORMAT_FIELDS = ("url", "ext", "acodec", "vcodec", "protocol", "height", "tbr",
+                 "filesize", "filesize_approx")
+ENTRY_FIELDS = ("id", "title", "url", "webpage_url", "ie_key")
+
+def _slim(info):
+    """
+    info projected to id/title, entries (ENTRY_FIELDS) and formats
+    (FORMAT_FIELDS); the top level keeps the FORMAT_FIELDS of yt-dlp's pick.
+    """
+    if not info:
+        return info
+    slim = {k: info.get(k) for k in FORMAT_FIELDS}
+    slim["id"] = info.get("id")
+    slim["title"] = info.get("title")
+    slim["formats"] = [{k: f.get(k) for k in FORMAT_FIELDS} for f in info.get("formats") or ()]
+    if info.get("entries"):
+        slim["entries"] = [e and {k: e.get(k) for k in ENTRY_FIELDS} for e in info["entries"]]
+    return slim
+
+def entry_url(e):
+    """Turn a (flat) playlist entry into a URL yt-dlp can fully extract."""
+    video_url = e.get("url") or e.get("webpage_url") or e.get("id")
+    if video_url and not video_url.startswith("http"):
+        video_url = f"https://www.youtube.com/watch?v={video_url}"
+    return video_url
+
+# get_ydl() kinds: "flat" only lists playlist entries (phase 1 probe),
+# "full" resolves formats
+YDL_KINDS = {
+    "full": {},
+    "flat": {"extract_flat": "in_playlist"},
+}
+
+def cookies_mtime():
+    """st_mtime_ns of cookies.txt, or None if there is none (see COOKIES_RECHECK)."""
+    now = time.monotonic()
+    if now - _cookies_state["checked"] >= COOKIES_RECHECK:
+        try:
+            mtime_ns = os.stat("cookies.txt").st_mtime_ns
+        except OSError:
+            mtime_ns = None
+        _cookies_state.update(checked=now, mtime_ns=mtime_ns)
+    return _cookies_state["mtime_ns"]
+
+def get_ydl(opts, kind="full"):
+    """
+    This thread's YoutubeDL of the given kind for opts (as built by
+    ydl_opts()). Constructing one registers every extractor, so it is
+    reused; instances are not thread-safe, hence one per thread and kind.
+    Rebuilt when cookies.txt appears, disappears or is replaced.
+    """
+    cookiefile = opts.get("cookiefile")
+    key = (cookiefile, cookies_mtime() if cookiefile else None)
+    cached = getattr(_ydl_local, kind, None)
+    if cached is None or cached[0] != key:
+        cached = (key, YoutubeDL({**opts, **YDL_KINDS[kind]}))
+        setattr(_ydl_local, kind, cached)
+    return cached[1]
+
+def extract_video(video_url, opts, ie_key=None):
+    """
+    Fully extract a single video with this thread's YoutubeDL.
+    ie_key (flat entries carry one) skips yt-dlp's extractor matching.
+    Returns the info dict, or None if yt-dlp failed.
+    """
+    try:
+        return _slim(get_ydl(opts).extract_info(video_url, download=False, ie_key=ie_key))
+    except Exception:
+        return None
+
+def playlist_item(e, opts):
+    """Resolve one flat playlist entry into an {id, title, file} item."""
+    known = _urls.get(e.get("id"))
+    if known:
+        return known
+    vinfo = extract_video(entry_url(e), opts, e.get("ie_key"))
+    if not vinfo:
+        return {
+            "id": e.get("id"),
+            "title": e.get("title"),
+            "file": None,
+            "reason": "Skipped (sign-in required / unavailable).",
+        }
+    best = selected_file(vinfo)
+    item = {
+        "id": vinfo.get("id") or e.get("id"),
+        "title": vinfo.get("title") or e.get("title"),
+        "file": fmt_to_file(best, head=True),
+    }
+    if not best:
+        item["reason"] = "No direct downloadable file (streaming-only)."
+    remember_video(item)
+    return item
+
+_YT_VIDEO_RE = re.compile(
+    r'(?:https?://)?(?:(?:www|m|music)\.)?'
+    r'(?:youtu\.be/|youtube\.com/(?:watch\?(?:[^#]*&)?v=|shorts/|embed/|live/))([A-Za-z0-9_-]{11})')
+_YT_PLAYLIST_RE = re.compile(
+    r'(?:https?://)?(?:(?:www|m|music)\.)?youtube\.com/(?:playlist|watch)\?(?:[^#]*&)?list=([A-Za-z0-9_-]+)')
+# list= anywhere after a matched video id (youtu.be/ID?list=..., the
+# "share from a playlist" link), up to the #fragment
+_YT_LIST_AFTER_RE = re.compile(r'[^#]*?[?&]list=([A-Za-z0-9_-]+)')
+
+def youtube_url(url: str):
+    """
+    Fast path for the common YouTube links: the canonical watch / playlist
+    URL, straight from two compiled regexes, or None for anything else.
+    """
+    video = _YT_VIDEO_RE.match(url)
+    playlist = _YT_PLAYLIST_RE.match(url) or (video and _YT_LIST_AFTER_RE.match(url, video.end()))
+    if video and playlist:
+        return f"https://www.youtube.com/watch?v={video.group(1)}&list={playlist.group(1)}"
+    if video:
+        return f"https://www.youtube.com/watch?v={video.group(1)}"
+    if playlist:
+        return f"https://www.youtube.com/playlist?list={playlist.group(1)}"
+    return None
+
+def youtube_ie_key(url: str):
+    """
+    yt-dlp extractor for a canonical URL. Pinning it makes yt-dlp check
+    just that one extractor's suitable() instead of scanning them all.
+    watch?v=...&list=... is YoutubeTab's: YoutubeIE refuses URLs with list=.
+    """
+    if url.startswith("https://www.youtube.com/playlist?list="):
+        return "YoutubeTab"
+    if url.startswith("https://www.youtube.com/watch?v="):
+        return "YoutubeTab" if "&list=" in url else "Youtube"
+    return None
+
+def normalize_url(url: str) -> str:
+    """
+    Canonicalize YouTube URLs so equivalent links share a cache slot:
+    youtu.be/ID and m./music. hosts become www.youtube.com/watch?v=ID and
+    tracking params (t, si, feature, ...) are dropped. Other URLs only
+    lose their #fragment.
+    """
+    canonical = youtube_url(url)
+    if canonical:
+        return canonical
+
+    parts = urllib.parse.urlsplit(url)
+    host = parts.netloc.lower()
+    if host not in YOUTUBE_HOSTS:
+        return urllib.parse.urlunsplit(parts._replace(fragment=""))
+
+    query = urllib.parse.parse_qsl(parts.query, keep_blank_values=True)
+    path = parts.path
+    if host == "youtu.be":
+        query.insert(0, ("v", path.strip("/")))
+        path = "/watch"
+    query = [(k, v) for k, v in query if k not in TRACKING_PARAMS and not k.startswith("utm_")]
+    return urllib.parse.urlunsplit(
+        ("https", "www.youtube.com", path, urllib.parse.urlencode(query), ""))
+
+def ydl_opts():
+    """yt-dlp options for metadata-only extraction (adds cookiefile if cookies.txt present)."""
+    opts = {
+        "skip_download": True,
+        "quiet": True,
+        "no_warnings": True,
+        "ignoreerrors": True,
+        "format": FORMAT_SELECTOR,
+        "extractor_args": YOUTUBE_ARGS,
+        "allowed_extractors": ALLOWED_EXTRACTORS,
     }
+    if cookies_mtime() is not None:
+        opts["cookiefile"] = "cookies.txt"
+    return opts
+
+# ASCII bytes sanitize_title() deletes: everything but A-Z a-z 0-9 " ._-"
+_TITLE_DROP = bytes(set(range(128)) - set(b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789 ._-"))
 
 def sanitize_title(title: str) -> str:
     """
     Sanitize title to an ASCII-safe filename for HTTP headers.
     Keep only A-Z, a-z, 0-9, space, dot, dash, underscore.
     """
-    title = title or "video"
-    title = re.sub(r'[^A-Za-z0-9 ._-]+', '', title)
-    title = title.strip()
-    if not title:
-        title = "video"
-    if len(title) > 100:
-        title = title[:100]
-    return title
+    safe = (title or "").encode("ascii", "ignore").translate(None, _TITLE_DROP).decode()
+    return (safe.strip() or "video")[:100]
 
 # ------------------- ROUTES -------------------
 
-@app.route("/")
-def index():
-    return render_template_string(HTML)
+_VIDEO_ID_RE = re.compile(r'[A-Za-z0-9_-]{11}')
+WATCH_PREFIX = "https://www.youtube.com/watch?v="
 
-@app.route("/extract", methods=["POST"])
-def extract():
-    data = request.get_json(silent=True) or {}
-    url = (data.get("url") or "").strip()
+@app.before_request
+def raise_upload_limit():
+    if request.endpoint == "upload_cookies":
+        request.max_content_length = COOKIES_MAX_BYTES
 
-    if not url:
-        return jsonify({"error": "URL is required"}), 400
-    if not (url.startswith("http://") or url.startswith("https://")):
-        return jsonify({"error": "URL must start with http:// or https://"}), 400
+@app.errorhandler(413)
+def payload_too_large(e):
+    return jsonify({"error": "payload too large"}), 413
 
-    # yt-dlp options (add cookiefile if cookies.txt present)
-    base_opts = {
-        "skip_download": True,
-        "quiet": True,
-        "no_warnings": True,
-        "ignoreerrors": True,
-    }
-    if os.path.exists("cookies.txt"):
-        base_opts["cookiefile"] = "cookies.txt"
+NO_INFO = {
+    "mode": "single",
+    "title": "Unavailable video",
+    "file": None,
+    "reason": "No info returned (maybe unavailable or blocked).",
+}
 
+@app.route("/")
+def index():
+    headers = {
+        "ETag": f'"{HTML_ETAG}"',
+        "Cache-Control": "public, max-age=3600",
+        "Vary": "Accept-Encoding",
+    }
+    # Repeat visits only revalidate
+    if request.if_none_match.contains_weak(HTML_ETAG):
+        return Response(status=304, headers=headers)
+    # Parsed with q-values, so "gzip;q=0" really means no gzip
+    encoding = request.accept_encodings.best_match(HTML_ENCODED)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+        return Response(HTML_ENCODED[encoding], mimetype="text/html", headers=headers)
+    return Response(HTML_BYTES, mimetype="text/html", headers=headers)
+
+def probe(url, opts):
+    """
+    Phase 1: flat probe. Playlists only list their entries (id/url/title),
+    plain videos are still fully extracted by this call.
+    Returns (info, None), or (None, payload) with a friendly failure reason.
+    """
     # Try to extract info; ANY error will return 200 with a friendly reason
     try:
-        with YoutubeDL(base_opts) as ydl:
-            info = ydl.extract_info(url, download=False)
+        info = _slim(get_ydl(opts, "flat").extract_info(url, download=False, ie_key=youtube_ie_key(url)))
     except Exception as e:
         msg = str(e)
         reason = "Cannot extract info."
@@ -610,97 +577,381 @@ def extract():
         elif "Video unavailable" in msg:
             reason = "Video unavailable (deleted, private or blocked)."
 
-        return jsonify({
+        return None, {
             "mode": "single",
             "title": "Unavailable video",
             "file": None,
             "reason": reason,
-        }), 200
+        }
 
     if not info:
-        return jsonify({
-            "mode": "single",
-            "title": "Unavailable video",
-            "file": None,
-            "reason": "No info returned (maybe unavailable or blocked).",
-        }), 200
+        return None, NO_INFO
+    return info, None
 
-    # PLAYLIST HANDLING
+def flat_entries(info):
+    """Usable entries of a probed playlist, or None if info is a plain video."""
     if "entries" in info and info["entries"]:
-        raw_entries = [e for e in info["entries"] if e]
-
-        if len(raw_entries) > 1:
-            out_entries = []
-            for e in raw_entries:
-                video_url = e.get("url") or e.get("webpage_url") or e.get("id")
-                if not video_url:
-                    continue
-                if not video_url.startswith("http"):
-                    video_url = f"https://www.youtube.com/watch?v={video_url}"
-
-                try:
-                    with YoutubeDL(base_opts) as vdl:
-                        vinfo = vdl.extract_info(video_url, download=False)
-                except Exception:
-                    out_entries.append({
-                        "id": e.get("id"),
-                        "title": e.get("title"),
-                        "file": None,
-                        "reason": "Skipped (sign-in required / unavailable).",
-                    })
-                    continue
-
-                fmts = vinfo.get("formats") or []
-                best = choose_best_file(fmts)
-                out_entries.append({
-                    "id": vinfo.get("id") or e.get("id"),
-                    "title": vinfo.get("title") or e.get("title"),
-                    "file": fmt_to_file(best),
-                })
-
-            return jsonify({
-                "mode": "playlist",
-                "title": info.get("title") or "Playlist",
-                "entries": out_entries,
-                "reason": None if out_entries else "All items unavailable / locked.",
-            }), 200
-
-        elif len(raw_entries) == 1:
-            entry = raw_entries[0]
-        else:
-            return jsonify({
-                "mode": "playlist",
-                "title": info.get("title") or "Playlist",
-                "entries": [],
-                "reason": "No playable items found in this playlist.",
-            }), 200
-    else:
+        return [e for e in info["entries"] if e and entry_url(e)]
+    return None
+
+def playlist_payload(info, items, lazy=False):
+    """lazy: items only carry id/title/url, their files come from /resolve."""
+    payload = {
+        "mode": "playlist",
+        "title": info.get("title") or "Playlist",
+        "entries": items,
+        "reason": None if items else "All items unavailable / locked.",
+    }
+    if lazy:
+        payload["lazy"] = True
+    return payload
+
+def direct_payload(info, entries, opts):
+    """Payload for anything but a multi-item playlist (which needs phase 2)."""
+    if entries is None:
         entry = info  # Not a playlist
+    elif len(entries) == 1:
+        entry = extract_video(entry_url(entries[0]), opts, entries[0].get("ie_key"))
+        if not entry:
+            return NO_INFO
+    else:
+        return {
+            "mode": "playlist",
+            "title": info.get("title") or "Playlist",
+            "entries": [],
+            "reason": "No playable items found in this playlist.",
+        }
 
     # SINGLE VIDEO
-    fmts = entry.get("formats") or []
-    best = choose_best_file(fmts)
+    best = selected_file(entry)
 
     if not best:
-        return jsonify({
+        return {
             "mode": "single",
             "title": entry.get("title"),
             "file": None,
             "reason": "No direct downloadable file (maybe sign-in or streaming-only).",
-        }), 200
+        }
 
-    return jsonify({
+    file = fmt_to_file(best)
+    remember_video({"id": entry.get("id"), "title": entry.get("title"), "file": file})
+    return {
         "mode": "single",
         "title": entry.get("title"),
-        "file": fmt_to_file(best),
-    }), 200
+        "file": file,
+    }
+
+def extract_payload(url):
+    """
+    Run yt-dlp on url and build the JSON payload /extract returns.
+    Playlists stop after the flat probe (see playlist_payload(lazy=True)).
+    """
+    base_opts = ydl_opts()
+    info, failed = probe(url, base_opts)
+    if failed:
+        return failed
+
+    entries = flat_entries(info)
+    if entries is None or len(entries) < 2:
+        return direct_payload(info, entries, base_opts)
+
+    # Items are resolved on demand through /resolve?url=<entry url>; the
+    # entry's own URL, so non-YouTube and id-less entries resolve too
+    return playlist_payload(info, [
+        {"id": e.get("id"), "title": e.get("title"), "url": entry_url(e), "file": None}
+        for e in entries
+    ], lazy=True)
+
+def stream_extract(url):
+    """
+    extract_payload() as NDJSON lines, for /extract_stream:
+      {"type": "start", "title", "count", "entries": [{id, title}, ...]}
+      {"type": "entry", "index", "id", "title", "file"[, "reason"]}
+        -- one per playlist item, in completion order
+      {"type": "end"}
+    Unlike /extract, every playlist item is resolved here (phase 2), on
+    POOL. Anything but a multi-item playlist (and any cache hit) is a
+    single {"type": "result", ...payload} line instead.
+    """
+    def line(obj):
+        return app.json.dumps(obj) + "\n"
+
+    key = "stream:" + url
+    payload = cache_lookup(key)
+    if payload is not None:
+        yield line({"type": "result", **payload})
+        return
+
+    base_opts = ydl_opts()
+    info, failed = probe(url, base_opts)
+    entries = None if failed else flat_entries(info)
+    if failed or entries is None or len(entries) < 2:
+        payload = failed or direct_payload(info, entries, base_opts)
+        cache_store(key, payload)
+        yield line({"type": "result", **payload})
+        return
+
+    yield line({
+        "type": "start",
+        "title": info.get("title") or "Playlist",
+        "count": len(entries),
+        "entries": [{"id": e.get("id"), "title": e.get("title")} for e in entries],
+    })
+    items = [None] * len(entries)
+    futures = {POOL.submit(playlist_item, e, base_opts): i for i, e in enumerate(entries)}
+    try:
+        for fut in as_completed(futures):
+            i = futures[fut]
+            items[i] = fut.result()
+            yield line({"type": "entry", "index": i, **items[i]})
+    finally:
+        # Client gone: don't keep resolving items nobody will see
+        for fut in futures:
+            fut.cancel()
+
+    cache_store(key, playlist_payload(info, items))
+    yield line({"type": "end"})
+
+def cache_lookup(key):
+    """Cached payload for key (hot layer first, then disk), or None."""
+    payload = _hot.get(key)
+    if payload is not None:
+        return payload
+
+    payload = cache.get(key)
+    if payload is not None:
+        _hot.set(key, payload, HOT_TTL)
+    return payload
+
+def cache_store(key, payload):
+    """Cache a payload; those carrying a failure reason are skipped so they get retried."""
+    if payload.get("reason"):
+        return
+    cache.set(key, payload, expire=LISTING_TTL if payload.get("lazy") else CACHE_TTL)
+    _hot.set(key, payload, HOT_TTL)
+
+def remember_video(item):
+    """Keep a resolved {id, title, file} item for as long as its link is valid."""
+    file = item.get("file")
+    if not item.get("id") or not file:
+        return
+    ttl = URL_TTL
+    query = urllib.parse.parse_qs(urllib.parse.urlsplit(file["url"]).query)
+    try:
+        # 5 min margin so a link never expires mid-download
+        ttl = min(ttl, int(query["expire"][0]) - time.time() - 300)
+    except (KeyError, ValueError):
+        pass
+    if ttl > 0:
+        _urls.set(item["id"], item, ttl)
+
+def cached_extract(url):
+    """
+    extract_payload() behind two cache layers: a small in-process dict for
+    hot repeats, then the on-disk cache shared by all workers. Concurrent
+    misses for the same url share one extraction (singleflight): the first
+    caller runs it, the others wait up to INFLIGHT_WAIT for its payload.
+    """
+    key = "extract:" + url
+    payload = cache_lookup(key)
+    if payload is not None:
+        return payload
+
+    with _inflight_lock:
+        flight = _inflight.get(key)
+        leader = flight is None
+        if leader:
+            flight = _inflight[key] = {"done": threading.Event(), "payload": None}
+    if not leader:
+        flight["done"].wait(INFLIGHT_WAIT)
+        if flight["payload"] is not None:
+            return flight["payload"]
+        # the first caller failed or is still at it: extract on our own
+
+    try:
+        payload = extract_payload(url)
+        cache_store(key, payload)
+        if leader:
+            flight["payload"] = payload
+        return payload
+    finally:
+        if leader:
+            with _inflight_lock:
+                del _inflight[key]
+            flight["done"].set()
+
+def conditional_json(payload):
+    """
+    jsonify(payload) with a content ETag, answering 304 when the client
+    already holds it. Good results may be reused for EXTRACT_MAX_AGE;
+    failures must always be revalidated so a retry really retries.
+    """
+    resp = jsonify(payload)
+    resp.set_etag(hashlib.sha1(resp.get_data()).hexdigest())
+    resp.headers["Cache-Control"] = (
+        "private, no-cache" if payload.get("reason") else f"private, max-age={EXTRACT_MAX_AGE}")
+    # by hand, since make_conditional() only handles GET/HEAD, not POST /extract
+    if request.if_none_match.contains_weak(resp.get_etag()[0]):
+        return Response(status=304, headers={k: resp.headers[k] for k in ("ETag", "Cache-Control")})
+    return resp
+
+def checked_url(url):
+    """A submitted URL, canonicalized, or (None, error response)."""
+    url = url.strip() if isinstance(url, str) else ""
+    if not url:
+        return None, (jsonify({"error": "URL is required"}), 400)
+    canonical = youtube_url(url)
+    if canonical:
+        return canonical, None
+    if not (url.startswith("http://") or url.startswith("https://")):
+        return None, (jsonify({"error": "URL must start with http:// or https://"}), 400)
+    return normalize_url(url), None
+
+def url_from_request():
+    """The submitted URL from the JSON body, or (None, error response)."""
+    data = request.get_json(silent=True)
+    return checked_url(data.get("url") if isinstance(data, dict) else None)
+
+@app.route("/extract", methods=["POST"])
+def extract():
+    url, error = url_from_request()
+    if error:
+        return error
+    return conditional_json(cached_extract(url))
+
+@app.route("/extract_stream", methods=["POST"])
+def extract_stream():
+    """Like /extract, but NDJSON so playlist items render as they resolve."""
+    url, error = url_from_request()
+    if error:
+        return error
+    return Response(stream_with_context(stream_extract(url)), mimetype="application/x-ndjson")
+
+@app.route("/resolve/<vid>")
+def resolve(vid):
+    """Single-video payload for one (lazy) playlist item, by YouTube id."""
+    if not _VIDEO_ID_RE.fullmatch(vid):
+        return jsonify({"error": "Invalid video id"}), 400
+    known = _urls.get(vid)
+    if known:
+        return conditional_json({"mode": "single", "title": known["title"], "file": known["file"]})
+    return conditional_json(cached_extract(f"https://www.youtube.com/watch?v={vid}"))
+
+@app.route("/resolve")
+def resolve_url():
+    """Single-video payload for one lazy playlist item, by its entry ?url=."""
+    url, error = checked_url(request.args.get("url"))
+    if error:
+        return error
+    # Plain YouTube videos: same _urls fast path and cache slot as by id
+    vid = url[len(WATCH_PREFIX):] if url.startswith(WATCH_PREFIX) else ""
+    if _VIDEO_ID_RE.fullmatch(vid):
+        return resolve(vid)
+    return conditional_json(cached_extract(url))
+
+@app.route("/cache/clear", methods=["POST"])
+def cache_clear():
+    """
+    Admin: drop the on-disk extraction cache (shared by all workers) and
+    this worker's in-process layers. Other workers' in-process copies run
+    out on their own: _hot within HOT_TTL, _urls with their links' expiry.
+    Needs "Authorization: Bearer <ADMIN_TOKEN>"; 404 while it is unset.
+    """
+    if not ADMIN_TOKEN:
+        return jsonify({"error": "Not found"}), 404
+    sent = request.headers.get("Authorization", "").encode()
+    if not hmac.compare_digest(sent, b"Bearer " + ADMIN_TOKEN.encode()):
+        return jsonify({"error": "Unauthorized"}), 401
+    _hot.clear()
+    _urls.clear()
+    cache.clear()
+    return jsonify({"message": "Cache cleared."}), 200
+
+def parse_content_range(content_range):
+    """(lo, hi, total) from a "bytes lo-hi/total" Content-Range, or None."""
+    try:
+        unit, _, rest = content_range.partition(" ")
+        span, _, total = rest.partition("/")
+        lo, _, hi = span.partition("-")
+        if unit == "bytes":
+            return int(lo), int(hi), int(total)
+    except (AttributeError, ValueError):
+        pass
+    return None
+
+def fetch_piece(url, headers, lo, hi, total):
+    """
+    Bytes lo..hi (inclusive) of url in one Range GET. headers carry the
+    If-Range of the first piece: a changed file comes back as 200, and
+    that (or any other answer but exactly these bytes) aborts the download.
+    """
+    with SESSION.get(url, headers={**headers, "Range": f"bytes={lo}-{hi}"}, timeout=(5, 30)) as r:
+        if (r.status_code != 206 or parse_content_range(r.headers.get("Content-Range")) != (lo, hi, total)
+                or len(r.content) != hi - lo + 1):
+            raise IOError(f"bytes {lo}-{hi}: upstream returned HTTP {r.status_code}")
+        return r.content
+
+def split_plan(first, headers):
+    """
+    (total, piece headers) if the answer to our bytes=0-... request can be
+    extended piece by piece, else (None, None): it must be a 206 for
+    exactly bytes 0..min(PARALLEL_PIECE, total)-1 and carry a strong
+    validator, which every later piece is then pinned to with If-Range.
+    """
+    if first.status_code != 206:
+        return None, None
+    span = parse_content_range(first.headers.get("Content-Range"))
+    if not span or span != (0, min(PARALLEL_PIECE, span[2]) - 1, span[2]):
+        return None, None
+    if span[2] <= PARALLEL_PIECE:
+        return span[2], headers  # that one piece is the whole file
+    etag = first.headers.get("ETag")
+    validator = etag if etag and not etag.startswith("W/") else first.headers.get("Last-Modified")
+    if not validator:
+        return None, None
+    return span[2], {**headers, "If-Range": validator}
+
+def parallel_body(url, headers, first, total, n):
+    """
+    Yield the whole file in order: first (the open, checked response for
+    bytes 0..PARALLEL_PIECE-1) is streamed through while the next pieces
+    are already being fetched, then a window of n pieces in flight is kept
+    until the end. headers must pin the pieces to first's validator.
+    """
+    pieces = iter([(lo, min(lo + PARALLEL_PIECE, total) - 1)
+                   for lo in range(PARALLEL_PIECE, total, PARALLEL_PIECE)])
+    pool = ThreadPoolExecutor(max_workers=n, thread_name_prefix="piece")
+    pending = deque()
+
+    def fill(limit):
+        while len(pending) < limit:
+            piece = next(pieces, None)
+            if piece is None:
+                return
+            pending.append(pool.submit(fetch_piece, url, headers, *piece, total))
+
+    try:
+        fill(n - 1)  # first is still holding one connection
+        yield from first.iter_content(PROXY_CHUNK)
+        first.close()
+        fill(n)
+        while pending:
+            data = pending.popleft().result()
+            fill(n)
+            yield data
+    finally:
+        first.close()
+        pool.shutdown(wait=False, cancel_futures=True)
 
 @app.route("/download")
 def download_proxy():
     """
     Proxy download:
-    - Takes ?url=...&title=...&ext=...
+    - Takes ?url=...&title=...&ext=...[&inline=1]
     - Streams the file and sets Content-Disposition so browser downloads it
+      (inline=1: plays it in place, for the Preview player)
+    - Passes Range through (206 + Content-Range) for seeking / resuming
+    - parallel=N (whole-file requests, if PARALLEL_MAX allows): see parallel_body()
     """
     url = request.args.get("url", "").strip()
     title = request.args.get("title", "").strip()
@@ -711,42 +962,147 @@ def download_proxy():
 
     safe_title = sanitize_title(title)
     filename = f"{safe_title}.{ext}"
-
-    def generate():
-        with urllib.request.urlopen(url) as resp:
-            while True:
-                chunk = resp.read(8192)
-                if not chunk:
-                    break
-                yield chunk
+    disposition = "inline" if request.args.get("inline") == "1" else "attachment"
+
+    if USE_X_ACCEL:
+        if urllib.parse.urlsplit(url).scheme not in ("http", "https"):
+            return "Bad url", 400
+        # nginx keeps Content-Disposition from this response and passes the
+        # client's Range/If-Range on to the internal proxy_pass
+        return Response(status=200, headers={
+            "X-Accel-Redirect": x_accel_location(url),
+            "Content-Disposition": f'{disposition}; filename="{filename}"',
+            "Content-Type": "application/octet-stream",
+        })
+
+    # Range makes <video> seeking and resumed downloads fetch only the
+    # bytes asked for; the upstream 206 is mirrored back below.
+    fwd = {k: request.headers[k] for k in FORWARD_HEADERS if k in request.headers}
+    # Raw bytes are passed through untouched, so they must not be gzipped
+    fwd["Accept-Encoding"] = "identity"
+    # parallel: open with our own bytes=0-... so the upstream reports the size
+    parallel = min(max(request.args.get("parallel", 1, type=int), 1), PARALLEL_MAX)
+    split = parallel > 1 and "Range" not in fwd
+    first = {**fwd, "Range": f"bytes=0-{PARALLEL_PIECE - 1}"} if split else fwd
+    total = None
+    try:
+        upstream = SESSION.get(url, stream=True, headers=first, timeout=(5, 30))
+        if split:
+            total, piece_headers = split_plan(upstream, fwd)
+            if not total and upstream.status_code in (206, 416):
+                # not safely splittable (or an empty file): one plain GET
+                upstream.close()
+                upstream = SESSION.get(url, stream=True, headers=fwd, timeout=(5, 30))
+    except requests.RequestException as e:
+        return f"Upstream fetch failed: {e}", 502
+    if upstream.status_code == 416:
+        upstream.close()
+        return Response(status=416, headers={"Content-Range": upstream.headers.get("Content-Range", "")})
+    if upstream.status_code >= 400:
+        upstream.close()
+        return f"Upstream returned HTTP {upstream.status_code}", 502
 
     headers = {
-        "Content-Disposition": f'attachment; filename="{filename}"',
-        "Content-Type": "application/octet-stream",
+        "Content-Disposition": f'{disposition}; filename="{filename}"',
+        "Content-Type": upstream.headers.get("Content-Type", "application/octet-stream"),
+        "Accept-Ranges": "bytes",
     }
-    return Response(stream_with_context(generate()), headers=headers)
+    # Content-Length lets the browser show real progress; the validators
+    # let resuming clients send If-Range
+    for k in ("Content-Length", "Content-Range", "ETag", "Last-Modified"):
+        if k in upstream.headers:
+            headers[k] = upstream.headers[k]
+    # Hand the raw upstream stream to the server's wsgi.file_wrapper: it is
+    # read PROXY_CHUNK bytes at a time with no Python generator in between,
+    # and closing the response closes the upstream (also on disconnect).
+    body = wrap_file(request.environ, upstream.raw, buffer_size=PROXY_CHUNK)
+    status = upstream.status_code
+    if total:
+        # The client asked for the whole file; the 206 is only ours
+        status = 200
+        headers.pop("Content-Range", None)
+        headers["Content-Length"] = str(total)
+        if total > PARALLEL_PIECE:
+            body = parallel_body(url, piece_headers, upstream, total, parallel)
+    return Response(body, status=status, headers=headers, direct_passthrough=True)
+
+def x_accel_location(url):
+    """
+    Internal nginx URI for url: <prefix><scheme>/<host><path>?<query>.
+    nginx side (the location is `internal`, so clients can't hit it directly):
+
+        location ~ ^/_internal_dl/(https?)/([^/]+)(/.*)$ {
+            internal;
+            resolver 1.1.1.1;
+            proxy_pass $1://$2$3$is_args$args;
+            proxy_set_header Host $2;
+            proxy_set_header Accept-Encoding identity;
+            proxy_ssl_server_name on;
+            proxy_buffering on;
+        }
+    """
+    parts = urllib.parse.urlsplit(url)
+    loc = f"{X_ACCEL_PREFIX}{parts.scheme}/{parts.netloc}{parts.path or '/'}"
+    return f"{loc}?{parts.query}" if parts.query else loc
 
-@app.route("/upload_cookies", methods=["POST"])
+@app.route("/upload_cookies", methods=["POST", "PUT"])
 def upload_cookies():
     """
     Accepts a cookies.txt file uploaded from the frontend and saves it
     as cookies.txt in the current working directory.
+    - PUT: the raw file is the request body (what the frontend sends)
+    - POST: multipart form with a "file" field
+    Either way it is copied to disk 64 KiB at a time.
     """
-    if 'file' not in request.files:
-        return jsonify({"error": "No file part"}), 400
-    f = request.files['file']
-    if not f or f.filename == '':
-        return jsonify({"error": "No selected file"}), 400
+    if request.method == "PUT":
+        src = request.stream
+    else:
+        if 'file' not in request.files:
+            return jsonify({"error": "No file part"}), 400
+        f = request.files['file']
+        if not f or f.filename == '':
+            return jsonify({"error": "No selected file"}), 400
+        src = f.stream
+
+    # Never replace a good cookies.txt with an empty one
+    head = src.read(64 * 1024)
+    if not head:
+        return jsonify({"error": "Empty cookies file"}), 400
 
     save_path = os.path.join(os.getcwd(), "cookies.txt")
+    # Write a temp file next to it and rename it over cookies.txt: yt-dlp
+    # threads reading it meanwhile see the old file or the new one, never
+    # a half-written one
+    tmp_path = f"{save_path}.tmp.{os.getpid()}.{threading.get_ident()}"
     try:
-        f.save(save_path)
+        with open(tmp_path, "wb") as out:
+            out.write(head)
+            shutil.copyfileobj(src, out, 64 * 1024)
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp_path, save_path)
+        # Seen by the very next extract, no COOKIES_RECHECK wait
+        _cookies_state.update(checked=time.monotonic(), mtime_ns=os.stat(save_path).st_mtime_ns)
     except Exception as e:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        if isinstance(e, HTTPException):
+            raise  # e.g. a chunked body over COOKIES_MAX_BYTES: keep the 413
         return jsonify({"error": "Failed to save cookies.txt", "details": str(e)}), 500
 
     return jsonify({"message": "cookies.txt uploaded successfully. yt-dlp will use it for the next fetch."}), 200
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))
-    print(f"Starting Video Downloader on 0.0.0.0:{port}")
-    app.run(host="0.0.0.0", port=port, debug=False, threaded=True)
\ No newline at end of file
+    if os.environ.get("FLASK_DEV"):
+        print(f"Starting Video Downloader (dev server) on 0.0.0.0:{port}")
+        app.run(host="0.0.0.0", port=port)
+    else:
+        # Hand over to gunicorn (settings in gunicorn.conf.py)
+        here = os.path.dirname(os.path.abspath(__file__))
+        conf = os.path.join(here, "gunicorn.conf.py")
+        print(f"Starting Video Downloader (gunicorn) on 0.0.0.0:{port}")
+        os.execvp(sys.executable, [sys.executable, "-m", "gunicorn",
+                                   "-c", conf, "--pythonpath", here, "app:app"])
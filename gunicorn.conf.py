@@ -0,0 +1,48 @@
+"""
+gunicorn settings for the Video Downloader:
+
+    gunicorn -c gunicorn.conf.py app:app
+
+(`python app.py` execs exactly this.) gthread workers: /extract releases
+the GIL while yt-dlp waits on the network, and a long /download stream
+only pins one thread instead of a whole process.
+
+On Termux, where fork is cheap, use one worker per core:
+
+    WEB_CONCURRENCY=$(nproc) python app.py
+
+For many concurrent downloads, switch to gevent (pip install gevent):
+
+    WORKER_CLASS=gevent python app.py
+"""
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+worker_class = os.environ.get("WORKER_CLASS", "gthread")
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+threads = int(os.environ.get("THREADS", 16))
+
+if worker_class == "gevent":
+    # One process, every request a greenlet: hundreds of concurrent
+    # /download streams at a fraction of a thread's memory each.
+    # The worker monkey-patches sockets/threads before app.py is imported.
+    workers = int(os.environ.get("WEB_CONCURRENCY", 1))
+    worker_connections = int(os.environ.get("WORKER_CONNECTIONS", 1000))
+    # Every one of those may be a /download stream with its own upstream
+    # connection; let app.py's SESSION keep them alive instead of
+    # discarding all past the default 32 (app.py is imported after this,
+    # in the worker, so it sees the variable)
+    os.environ.setdefault("HTTP_POOL", str(worker_connections))
+else:
+    # Import app.py (and yt-dlp's extractor tables) once in the master and
+    # fork workers from it: no per-worker cold import, and the pages stay
+    # shared copy-on-write. Not under gevent, which must patch first.
+    # yt-dlp's lazy extractors are already on unless YTDLP_NO_LAZY_EXTRACTORS.
+    preload_app = True
+# Seconds a worker may go without a heartbeat before it is restarted.
+# gthread/gevent workers beat from their main loop, so long /download
+# streams are safe; under a sync worker this caps a single request.
+timeout = int(os.environ.get("TIMEOUT", 300))
+# Keep idle client connections open a little longer than gunicorn's 2s so
+# the page's follow-up /extract and /resolve calls reuse them.
+keepalive = int(os.environ.get("KEEPALIVE", 5))